@@ -5,14 +5,199 @@ A Python CLI tool that uses Google Gemini API to provide AI responses
 and suggest terminal commands for hackers and developers.
 """
 
+from __future__ import annotations
+
+import asyncio
+import functools
 import os
+import platform
+import re
+import selectors
+import shlex
+import shutil
 import sys
 import subprocess
-import json
-from typing import Optional, List, Dict, Any
-from google import genai
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from itertools import islice
+from typing import TYPE_CHECKING, Callable, Optional, List, Dict, Deque
 from datetime import datetime
 
+if TYPE_CHECKING:
+    from google.genai import types
+
+# Gemini model used for every request (and for the context cache)
+_MODEL = "gemini-2.0-flash-exp"
+# Lifetime of the server-side context cache holding the system prompt
+_CACHE_TTL_SECONDS = 3600
+# New history messages sent inline before they are folded into a fresh cache
+_CACHE_FOLD_MESSAGES = 6
+# Smallest prompt the model accepts for a context cache, estimated from its
+# length at a rough characters-per-token ratio instead of a count_tokens call
+_CACHE_MIN_TOKENS = 4096
+_CHARS_PER_TOKEN = 4
+# HTTP statuses of a cache create that retrying won't fix (the model can't
+# cache this prompt, no permission, unknown model); anything else - a timeout,
+# 429 or 5xx - is retried on the next request
+_CACHE_REFUSED_CODES = frozenset({400, 403, 404})
+# Most recent messages kept in memory; all of them go into each prompt (more
+# are kept while the context cache hasn't caught up with them yet)
+_HISTORY_WINDOW = 20
+# Matches the "RESPONSE:" / "COMMAND:" lines of a formatted model reply
+_RESP_RE = re.compile(r'^(RESPONSE|COMMAND):[ \t]*(.*)$', re.M)
+# Matches a complete (newline-terminated) "COMMAND:" line while streaming
+_COMMAND_LINE_RE = re.compile(r'^COMMAND:[^\n]*\n', re.M)
+# Matches the "[A<n>]" markers separating the answers of a batched reply
+_ANSWER_RE = re.compile(r'^\s*\[A(\d+)\]', re.M)
+# Bytes of command output kept from its start and end for the history (and
+# so for the next prompts); everything is still shown live
+_OUTPUT_HEAD_BYTES = 2048
+_OUTPUT_TAIL_BYTES = 2048
+# Most command output read from the shell in one go, and how often a read
+# waiting on the shell checks whether the session is closing
+_READ_CHUNK_SIZE = 65536
+_DRAIN_POLL_SECONDS = 0.2
+# How long output that may be the start of a status line (say, a command's
+# last newline) is held back before it is shown anyway
+_HOLD_SECONDS = 0.02
+# Common error patterns and their fixes, in priority order: commands that
+# can be offered to run ({command} is the failed command and {program} its
+# first word), then advice that is only shown
+_EXECUTABLE_FIXES = {
+    "command not found": "apt-get update && apt-get install -y {program}",
+    "permission denied": "sudo {command}",
+    "no such file or directory": "ls -la && {command}",
+    "access denied": "sudo {command}"
+}
+_ADVICE_FIXES = {
+    "connection refused": "Check if the service is running or firewall settings",
+    "network unreachable": "Check network connectivity with: ping 8.8.8.8",
+    "port already in use": "Check what's using the port with: netstat -tulnp",
+    "disk space": "Check disk usage with: df -h",
+    "memory": "Check memory usage with: free -h",
+    "syntax error": "Review the command syntax",
+    "authentication failed": "Check credentials or permissions"
+}
+_ERROR_RE = re.compile(
+    "|".join(map(re.escape, [*_EXECUTABLE_FIXES, *_ADVICE_FIXES])), re.IGNORECASE
+)
+# Follow-up requested speculatively after a command runs, and the user
+# inputs that accept it
+_FOLLOWUP_PROMPT = "Continue: analyze the latest command output and take the next step."
+_CONTINUE_WORDS = frozenset({"continue", "next", "go on", "proceed"})
+# The follow-up is usually thrown away, so it is kept cheap; a reply that
+# doesn't fit is dropped and requested again normally
+_PREFETCH_MAX_TOKENS = 128
+# Generation settings shared by every request. Replies are a couple of short
+# RESPONSE:/COMMAND: lines, so cap the output and stop if the model starts
+# writing the next conversation turn itself
+_TEMPERATURE = 0.2
+_MAX_OUTPUT_TOKENS = 400
+_STOP_SEQUENCES = ("\nUSER:",)
+
+# Main banner with gradient-like colors
+_BANNER_LINES = (
+    "\033[38;5;196m" + "  ██╗  ██╗ █████╗  ██████╗██╗  ██╗" + "\033[0m",
+    "\033[38;5;202m" + "  ██║  ██║██╔══██╗██╔════╝██║ ██╔╝" + "\033[0m", 
+    "\033[38;5;208m" + "  ███████║███████║██║     █████╔╝" + "\033[0m",
+    "\033[38;5;214m" + "  ██╔══██║██╔══██║██║     ██╔═██╗" + "\033[0m",
+    "\033[38;5;220m" + "  ██║  ██║██║  ██║╚██████╗██║  ██╗" + "\033[0m",
+    "\033[38;5;226m" + "  ╚═╝  ╚═╝╚═╝  ╚═╝ ╚═════╝╚═╝  ╚═╝" + "\033[0m",
+    "",
+    "\033[38;5;46m" + "   █████╗ ███████╗███████╗██╗███████╗████████╗ █████╗ ███╗   ██╗████████╗" + "\033[0m",
+    "\033[38;5;82m" + "  ██╔══██╗██╔════╝██╔════╝██║██╔════╝╚══██╔══╝██╔══██╗████╗  ██║╚══██╔══╝" + "\033[0m",
+    "\033[38;5;118m" + "  ███████║███████╗███████╗██║███████╗   ██║   ███████║██╔██╗ ██║   ██║   " + "\033[0m",
+    "\033[38;5;154m" + "  ██╔══██║╚════██║╚════██║██║╚════██║   ██║   ██╔══██║██║╚██╗██║   ██║   " + "\033[0m",
+    "\033[38;5;190m" + "  ██║  ██║███████║███████║██║███████║   ██║   ██║  ██║██║ ╚████║   ██║   " + "\033[0m",
+    "\033[38;5;226m" + "  ╚═╝  ╚═╝╚══════╝╚══════╝╚═╝╚══════╝   ╚═╝   ╚═╝  ╚═╝╚═╝  ╚═══╝   ╚═╝   " + "\033[0m"
+)
+# Subtitle and features with animated-style text
+_BANNER_FEATURES = (
+    "\033[1;38;5;201m🔥 ELITE HACKER AI ASSISTANT 🔥\033[0m",
+    "\033[1;38;5;129m🤖 Powered by Google Gemini 2.0 🤖\033[0m",
+    "",
+    "\033[38;5;46m[⚡] \033[1;37mPenetration Testing & Security Research\033[0m \033[38;5;46m[⚡]\033[0m",
+    "\033[38;5;196m[🛡️ ] \033[1;37mSystem Administration & DevOps\033[0m \033[38;5;196m[🛡️ ]\033[0m", 
+    "\033[38;5;75m[💻] \033[1;37mDevelopment & Automation Tasks\033[0m \033[38;5;75m[💻]\033[0m",
+    "\033[38;5;226m[🧠] \033[1;37mIntelligent Command Suggestions\033[0m \033[38;5;226m[🧠]\033[0m",
+    "\033[38;5;135m[🎯] \033[1;37mContext-Aware AI Responses\033[0m \033[38;5;135m[🎯]\033[0m"
+)
+# Warning shown under the banner, with blinking effect
+_BANNER_WARNING = (
+    "\n" + "\033[1;5;91m🚨 WARNING: FOR AUTHORIZED PENETRATION TESTING & RESEARCH ONLY! 🚨\033[0m\n"
+    "\033[1;93m⚖️  Always obtain proper authorization before security testing! ⚖️\033[0m\n"
+)
+# Matches the ANSI color codes, which take up no columns on screen
+_ANSI_RE = re.compile(r'\x1b\[[0-9;]*m')
+
+
+def _banner_row(text: str) -> str:
+    """Center a line of banner text between the box's side borders."""
+    # Remove ANSI codes to calculate actual text length
+    width = len(_ANSI_RE.sub('', text))
+    padding = (78 - width) // 2
+    return "\033[38;5;51m║\033[0m" + " " * padding + text + " " * (78 - padding - width) + "\033[38;5;51m║\033[0m"
+
+
+# The boxed banner, laid out once at import since it never changes
+_BANNER_ROWS = (
+    "\033[38;5;51m" + "╔" + "═" * 78 + "╗" + "\033[0m",
+    "\033[38;5;51m" + "║" + " " * 78 + "║" + "\033[0m",
+    *map(_banner_row, _BANNER_LINES),
+    "\033[38;5;51m" + "║" + " " * 78 + "║" + "\033[0m",
+    *map(_banner_row, _BANNER_FEATURES),
+    "\033[38;5;51m" + "║" + " " * 78 + "║" + "\033[0m",
+    "\033[38;5;51m" + "╚" + "═" * 78 + "╝" + "\033[0m",
+)
+# Everything _display_banner shows, as one string for a single write; it
+# starts by clearing the screen and homing the cursor
+_BANNER_STR = "\x1b[2J\x1b[H" + "\n".join([*_BANNER_ROWS, _BANNER_WARNING, ""])
+
+
+@dataclass(slots=True)
+class Message:
+    """A single conversation history entry."""
+    role: str
+    content: str
+    timestamp: int  # time.time_ns() when the message was added
+    line: str       # the entry as it appears in prompts, formatted once
+
+
+class _OutputCapture:
+    """The start and end of a command's output, in bounded memory."""
+    __slots__ = ("head", "tail", "dropped")
+
+    def __init__(self):
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.dropped = 0
+
+    def add(self, data: bytes):
+        """Record another chunk of output."""
+        room = _OUTPUT_HEAD_BYTES - len(self.head)
+        if room > 0:
+            self.head += data[:room]
+            data = data[room:]
+        self.tail += data
+        # Trim in bulk rather than on every chunk
+        excess = len(self.tail) - _OUTPUT_TAIL_BYTES
+        if excess > _OUTPUT_TAIL_BYTES:
+            del self.tail[:excess]
+            self.dropped += excess
+
+    def text(self) -> str:
+        """The captured output, with a marker where the middle was cut out."""
+        excess = max(0, len(self.tail) - _OUTPUT_TAIL_BYTES)
+        if not self.dropped and not excess:
+            return (self.head + self.tail).decode('utf-8', errors='replace')
+        head = self.head.decode('utf-8', errors='replace')
+        tail = self.tail[excess:].decode('utf-8', errors='replace')
+        return f"{head}\n... [{self.dropped + excess} bytes truncated] ...\n{tail}"
+
 
 class HackAssistant:
     def __init__(self):
@@ -24,11 +209,8 @@ class HackAssistant:
             print("export GOOGLE_API_KEY='your_api_key_here'")
             sys.exit(1)
         
-        # Configure the Gemini API
-        self.client = genai.Client(api_key=self.api_key)
-        
         # Conversation state
-        self.conversation_history: List[Dict[str, str]] = []
+        self.conversation_history: Deque[Message] = deque()
         self.current_context = {
             "working_directory": os.getcwd(),
             "os_info": self._get_system_info(),
@@ -42,26 +224,83 @@ class HackAssistant:
         print("\n" + "=" * 60)
         print("🎯 COMMANDS:")
         print("  'p' + Enter - New prompt")
+        print("  'b' + Enter - Batch several prompts into one request")
         print("  'c' + Enter - Close conversation")
         print("  'y' / 'n' - Accept/Deny suggested commands")
         print("=" * 60)
+        
+        # Configure the Gemini API. The SDK is imported here rather than at
+        # module load so the banner is on screen before its import cost is paid
+        import httpx
+        from google import genai
+        from google.genai import types
+        # One pooled HTTP/2 connection for every async call (and another for
+        # the few blocking ones), so only the first request pays for the
+        # TCP/TLS handshake and concurrent requests (batch, prefetch, cache
+        # refresh) multiplex over it. A failed connect is retried once.
+        # Passing httpx clients in HttpOptions needs google-genai >= 1.46
+        limits = httpx.Limits(max_keepalive_connections=8)
+        self._http = httpx.AsyncClient(
+            transport=httpx.AsyncHTTPTransport(http2=True, retries=1, limits=limits),
+            timeout=60.0
+        )
+        self._http_sync = httpx.Client(
+            transport=httpx.HTTPTransport(http2=True, retries=1, limits=limits),
+            timeout=60.0
+        )
+        self.client = genai.Client(
+            api_key=self.api_key,
+            http_options=types.HttpOptions(
+                httpx_client=self._http_sync,
+                httpx_async_client=self._http
+            )
+        )
+        
+        # Cache the system prompt, session context and (periodically) the
+        # conversation so far server-side, so only new turns are sent inline
+        self._background_tasks = set()
+        self._prefetch_task: Optional[asyncio.Task] = None
+        self._history_count = 0   # messages ever added to the history
+        self._cached_count = 0    # of those, how many the context cache holds
+        self._next_fold_at = _CACHE_FOLD_MESSAGES
+        self._cache_fold_task: Optional[asyncio.Task] = None
+        self._retired_cache = None
+        self._caching_failed = False  # a cache create was refused; don't keep asking
+        self._cached_context_block = self._context_block
+        self.system_cache = self._create_system_cache()
+        self._cache_refreshed_at = time.monotonic()
+        
+        # One persistent shell runs every command, so each one skips the
+        # fork/exec/startup of a new shell and cd/export carry over between
+        # commands. Commands read the user's stdin through a duplicate of it
+        self._command_stdin = os.dup(sys.stdin.fileno())
+        os.set_inheritable(self._command_stdin, True)
+        self._sentinel = f"__HA_RC_{uuid.uuid4().hex}__".encode()
+        self._shell = self._start_shell()
+        # Long-lived worker threads for blocking work, instead of a new
+        # thread per command
+        self._io_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="hackassist")
+        # Pool threads are joined at exit, so a drain still waiting on the
+        # shell must be told to give up (see _close)
+        self._stop_drain = threading.Event()
 
-    def _get_system_info(self) -> str:
-        """Get basic system information."""
+    @staticmethod
+    @functools.cache
+    def _get_system_info() -> str:
+        """Get basic system information (computed once per process)."""
         try:
-            import platform
+            # One uname() syscall instead of three platform.* lookups
+            if hasattr(os, 'uname'):
+                uname = os.uname()
+                return f"{uname.sysname} {uname.release} ({uname.machine})"
             return f"{platform.system()} {platform.release()} ({platform.machine()})"
         except Exception:
             return "Unknown Linux system"
 
-    def _create_system_prompt(self) -> str:
-        """Create a system prompt with context about the environment."""
-        return f"""You are HackAssistant, an AI assistant for hackers and developers working on Linux systems.
-
-Current context:
-- Working Directory: {self.current_context['working_directory']}
-- System: {self.current_context['os_info']}
-- Session started: {self.current_context['session_start']}
+    @functools.cached_property
+    def _static_preamble(self) -> str:
+        """Invariant instructions, emitted first so every prompt shares the same prefix."""
+        return """You are HackAssistant, an AI assistant for hackers and developers working on Linux systems.
 
 Your role:
 1. Provide helpful responses for hacking, development, and system administration tasks
@@ -93,275 +332,738 @@ When suggesting commands:
 - Use Linux/bash compatible commands only
 - Build upon previous command results when appropriate
 - If previous command failed, prioritize fixing the error
+- Avoid programs that wait for input (editors, pagers, prompts); prefer non-interactive flags such as --no-pager or -y
 
 Format your response as:
 RESPONSE: [Your helpful response here, referencing previous outputs if relevant]
 COMMAND: [Single terminal command to execute, or NONE if no command needed]
 
+Examples of well-formed exchanges:
+
+USER: scan for open ports on localhost
+RESPONSE: A TCP connect scan lists the listening services on this machine without needing raw socket privileges. Review the open ports and map each one to the service you expect.
+COMMAND: nmap -sT localhost
+
+USER: show me what is listening on port 8080
+RESPONSE: ss shows the socket together with the owning process, so you can see which program holds the port and under which PID.
+COMMAND: ss -tulnp | grep :8080
+
+EXECUTED: cat /etc/shadow
+OUTPUT: cat: /etc/shadow: Permission denied
+Return code: 1
+USER: why did that fail?
+RESPONSE: /etc/shadow is readable only by root, so the read was rejected with "Permission denied". Re-run the command with elevated privileges.
+COMMAND: sudo cat /etc/shadow
+
+EXECUTED: gobuster dir -u http://10.10.10.5 -w /usr/share/wordlists/dirb/common.txt
+OUTPUT: /bin/sh: 1: gobuster: not found
+Return code: 127
+USER: it didn't work
+RESPONSE: gobuster is not installed on this system (return code 127 means the shell could not find the program). Install it from the distribution repositories, then re-run the scan.
+COMMAND: sudo apt-get update && sudo apt-get install -y gobuster
+
+USER: what is the difference between TCP and UDP scanning?
+RESPONSE: TCP scans rely on the connection handshake, so open, closed and filtered ports answer distinctly and scans are fast. UDP is connectionless: open ports often stay silent, closed ports answer with ICMP port-unreachable, and rate limiting makes UDP scans much slower. Scan UDP selectively (for example the top 100 ports) when you need it.
+COMMAND: NONE
+
+EXECUTED: curl -I https://example.internal
+OUTPUT: curl: (6) Could not resolve host: example.internal
+Return code: 6
+USER: check what is wrong
+RESPONSE: The hostname could not be resolved, so the request never reached the network. Verify which DNS servers the system is using before testing connectivity further.
+COMMAND: resolvectl status
+
+EXECUTED: find . -name "*.py" -newer setup.py
+OUTPUT: ./app/server.py
+./app/auth.py
+USER: look at the auth changes
+RESPONSE: Two Python files changed since setup.py; app/auth.py is the one handling authentication. Show its recent history to see what was modified.
+COMMAND: git log -p -n 3 -- app/auth.py
+
+EXECUTED: tar -xzf backup.tar.gz
+OUTPUT: tar: backup.tar.gz: Cannot open: No such file or directory
+tar: Error is not recoverable: exiting now
+Return code: 2
+USER: where did the archive go?
+RESPONSE: The archive is not in the current directory, so tar had nothing to open. Search for it by name under your home directory, then extract it using the full path.
+COMMAND: find ~ -name "backup.tar.gz" 2>/dev/null
+
 Keep responses focused and actionable for a technical audience."""
 
+    @functools.cached_property
+    def _context_block(self) -> str:
+        """Session context, formatted once and again only when the working directory changes."""
+        return f"""Current context:
+- Working Directory: {self.current_context['working_directory']}
+- System: {self.current_context['os_info']}
+- Session started: {self.current_context['session_start']}
+"""
+
+    def _dynamic_context(self) -> str:
+        """Session context and recent history, which change between requests."""
+        # Add recent conversation history (last messages to include more command outputs)
+        hist_lines = [msg.line for msg in self.conversation_history]
+        return "\n".join([self._context_block, "Conversation History:", *hist_lines, ""])
+
+    def _history_lines(self, count: int) -> List[str]:
+        """Prompt lines for the last `count` history messages."""
+        history = self.conversation_history
+        recent_history = islice(history, max(0, len(history) - count), None)
+        return [msg.line for msg in recent_history]
+
+    def _format_history_entry(self, role: str, content: str) -> str:
+        """Format one history message as a prompt line."""
+        # Format system messages (command outputs) more clearly
+        if role == 'system':
+            if content.startswith('Executed command:'):
+                return f"EXECUTED: {content.replace('Executed command: ', '')}"
+            elif content.startswith('Command output:'):
+                return f"OUTPUT: {content.replace('Command output: ', '')}"
+            return f"SYSTEM: {content}"
+        return f"{role.upper()}: {content}"
+
+    def _cache_config(self) -> types.CreateCachedContentConfig:
+        """Context cache holding the system prompt, session context and history so far."""
+        from google.genai import types
+        return types.CreateCachedContentConfig(
+            system_instruction=self._static_preamble,
+            contents=[self._dynamic_context()],
+            ttl=f"{_CACHE_TTL_SECONDS}s"
+        )
+
+    def _cacheable(self) -> bool:
+        """Whether creating a context cache now is worth a request."""
+        size = len(self._static_preamble) + len(self._dynamic_context())
+        return not self._caching_failed and size >= _CACHE_MIN_TOKENS * _CHARS_PER_TOKEN
+
+    def _create_system_cache(self):
+        """Create an explicit context cache holding the system prompt."""
+        if not self._cacheable():
+            # Too small to cache yet; the prompt is sent inline until the
+            # history grows enough for a fold to cache it
+            return None
+        try:
+            return self.client.caches.create(model=_MODEL, config=self._cache_config())
+        except Exception as e:
+            # Caching is an optimization only - fall back to sending the
+            # prompt inline (for the rest of the session if it was refused)
+            self._caching_failed = getattr(e, "code", None) in _CACHE_REFUSED_CODES
+            return None
+
+    async def _fold_history_into_cache(self):
+        """Replace the context cache with one that also holds the recent history."""
+        count = self._history_count
+        context_block = self._context_block
+        try:
+            if not self._cacheable():
+                return
+            cache = await self.client.aio.caches.create(model=_MODEL, config=self._cache_config())
+        except Exception as e:
+            if getattr(e, "code", None) not in _CACHE_REFUSED_CODES:
+                # Keep using the current cache (or inline prompt) and try
+                # again on the next request
+                self._next_fold_at = min(self._next_fold_at, count)
+                return
+            # Folding is over for the session. The current cache would only
+            # ever hold this snapshot, so go back to the full inline prompt
+            self._caching_failed = True
+            cache = None
+        finally:
+            self._cache_fold_task = None
+        # The replaced cache may still back a request in flight, so it is only
+        # deleted once it has been superseded twice (or at shutdown)
+        stale_cache, self._retired_cache = self._retired_cache, self.system_cache
+        self.system_cache = cache
+        self._cached_count = count
+        self._cached_context_block = context_block
+        self._cache_refreshed_at = time.monotonic()
+        self.__dict__.pop('_gen_config', None)
+        await self._delete_cache(stale_cache)
+
+    async def _delete_cache(self, cache):
+        """Delete a context cache, ignoring failures (it expires on its own anyway)."""
+        if cache:
+            try:
+                await self.client.aio.caches.delete(name=cache.name)
+            except Exception:
+                pass
+
+    async def _refresh_system_cache(self):
+        """Extend the context cache TTL so it outlives an active session."""
+        from google.genai import types
+        try:
+            await self.client.aio.caches.update(
+                name=self.system_cache.name,
+                config=types.UpdateCachedContentConfig(ttl=f"{_CACHE_TTL_SECONDS}s")
+            )
+        except Exception:
+            self.system_cache = None
+            self.__dict__.pop('_gen_config', None)
+
+    def _run_in_background(self, coro):
+        """Schedule a coroutine without awaiting it, keeping a reference to the task."""
+        task = asyncio.create_task(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+        return task
+
+    async def _close(self):
+        """Release server-side resources held for the session."""
+        self._cancel_prefetch()
+        if self._cache_fold_task:
+            self._cache_fold_task.cancel()
+        # Stop any drain still running (e.g. after Ctrl+C), then the shell;
+        # the drain notices within _DRAIN_POLL_SECONDS, so the pool's threads
+        # can be joined before the read end of the pipe is closed under them
+        self._stop_drain.set()
+        if self._shell.poll() is None:
+            self._shell.stdin.close()
+            try:
+                self._shell.wait(timeout=1)
+            except subprocess.TimeoutExpired:
+                self._shell.kill()
+        self._io_pool.shutdown(wait=True, cancel_futures=True)
+        self._shell.stdout.close()
+        await self._delete_cache(self._retired_cache)
+        await self._delete_cache(self.system_cache)
+        self._retired_cache = self.system_cache = None
+        await self._http.aclose()
+        self._http_sync.close()
+
     def _add_to_history(self, role: str, content: str):
         """Add message to conversation history."""
-        self.conversation_history.append({
-            "role": role,
-            "content": content,
-            "timestamp": datetime.now().isoformat()
-        })
-
-    def _get_ai_response(self, user_prompt: str) -> tuple[str, Optional[str]]:
-        """Get response from Gemini API."""
+        # Messages never change once added, so each is formatted for the
+        # prompt here rather than on every request that includes it
+        line = self._format_history_entry(role, content)
+        history = self.conversation_history
+        history.append(Message(role, content, time.time_ns(), line))
+        self._history_count += 1
+        # Drop what falls out of the window, except messages the context cache
+        # doesn't hold yet: with a cache, those are only ever sent inline
+        keep = _HISTORY_WINDOW
+        if self.system_cache:
+            keep = max(keep, self._history_count - self._cached_count)
+        while len(history) > keep:
+            history.popleft()
+
+    @functools.cached_property
+    def _gen_config(self) -> types.GenerateContentConfig:
+        """Request config reused by every call (rebuilt only if the context cache goes away)."""
+        from google.genai import types
+        return types.GenerateContentConfig(
+            temperature=_TEMPERATURE,
+            max_output_tokens=_MAX_OUTPUT_TOKENS,
+            stop_sequences=list(_STOP_SEQUENCES),
+            cached_content=self.system_cache.name if self.system_cache else None
+        )
+
+    @functools.cached_property
+    def _fix_config(self) -> types.GenerateContentConfig:
+        """Config for error-fix requests, which send a bare prompt and so must not use the context cache."""
+        return self._gen_config.model_copy(update={"cached_content": None})
+
+    def _build_request(self, *prompt_lines: str,
+                       max_output_tokens: Optional[int] = None) -> tuple[str, types.GenerateContentConfig]:
+        """Assemble the prompt text and request config for a Gemini call."""
+        # Stable preamble first, then the volatile context, so consecutive
+        # prompts share the longest possible prefix for Gemini's prefix cache
+        config = self._gen_config
+        if max_output_tokens:
+            config = config.model_copy(update={"max_output_tokens": max_output_tokens})
+        if self.system_cache:
+            # Preamble, context and older history are already held in the
+            # explicit context cache - send only the messages added since
+            parts = self._history_lines(self._history_count - self._cached_count)
+            if self._context_block != self._cached_context_block:
+                # The working directory changed; the cached context is stale
+                # until the next fold replaces it
+                parts.insert(0, self._context_block)
+        else:
+            parts = [self._static_preamble, "", self._dynamic_context()]
+        parts.extend(prompt_lines)
+        
+        if (self._history_count >= self._next_fold_at and not self._cache_fold_task
+                and not self._caching_failed):
+            # Enough new turns have piled up (or the prompt was too small to
+            # cache so far) - fold them into a new cache in the background
+            self._next_fold_at = self._history_count + _CACHE_FOLD_MESSAGES
+            self._cache_fold_task = self._run_in_background(self._fold_history_into_cache())
+        elif self.system_cache and time.monotonic() - self._cache_refreshed_at > _CACHE_TTL_SECONDS / 2:
+            self._cache_refreshed_at = time.monotonic()
+            self._run_in_background(self._refresh_system_cache())
+        return "\n".join(parts), config
+
+    async def _stream_reply(self, contents: str, config: types.GenerateContentConfig,
+                            stop_after_command: bool = False,
+                            header: Optional[str] = "\n🤖 AI Response:") -> str:
+        """Stream a Gemini reply to the terminal and return the full text."""
+        stream = await self.client.aio.models.generate_content_stream(
+            model=_MODEL,
+            contents=contents,
+            config=config
+        )
+        chunks = []
+        partial_line = ""  # Text after the last newline, carried between chunks
         try:
-            # Build conversation context
-            context_messages = []
-            
-            # Add system prompt
-            system_prompt = self._create_system_prompt()
-            
-            # Add recent conversation history (last 20 messages to include more command outputs)
-            recent_history = self.conversation_history[-20:] if len(self.conversation_history) > 20 else self.conversation_history
-            
-            conversation_context = system_prompt + "\n\nConversation History:\n"
-            for msg in recent_history:
-                role = msg['role'].upper()
-                content = msg['content']
+            async for chunk in stream:
+                text = chunk.text
+                if not text:
+                    continue
                 
-                # Format system messages (command outputs) more clearly
-                if msg['role'] == 'system':
-                    if content.startswith('Executed command:'):
-                        conversation_context += f"EXECUTED: {content.replace('Executed command: ', '')}\n"
-                    elif content.startswith('Command output:'):
-                        conversation_context += f"OUTPUT: {content.replace('Command output: ', '')}\n"
-                    else:
-                        conversation_context += f"SYSTEM: {content}\n"
-                else:
-                    conversation_context += f"{role}: {content}\n"
-            
-            conversation_context += f"\nUSER: {user_prompt}\n\nRespond in the specified format:"
+                # Nothing after the COMMAND: line is used, so optionally stop
+                # generating (and paying for) tokens as soon as it is complete
+                done = False
+                if stop_after_command:
+                    text, partial_line, done = self._cut_after_command(partial_line, text)
+                
+                if not chunks and header is not None:
+                    print(header)
+                sys.stdout.write(text)
+                sys.stdout.flush()
+                chunks.append(text)
+                if done:
+                    break
+        finally:
+            # Closing the stream releases the connection if we stopped early
+            await stream.aclose()
+        if chunks and not chunks[-1].endswith("\n"):
+            print()
+        return "".join(chunks).strip()
+
+    @staticmethod
+    def _cut_after_command(partial_line: str, text: str) -> tuple[str, str, bool]:
+        """Trim a streamed chunk after a complete COMMAND: line.
+
+        Returns the chunk text to keep, the new partial last line, and whether
+        the COMMAND: line has been completed.
+        """
+        scan = partial_line + text
+        match = _COMMAND_LINE_RE.search(scan)
+        if match:
+            return text[:match.end() - len(partial_line)], "", True
+        return text, scan[scan.rfind("\n") + 1:], False
+
+    def _parse_reply(self, ai_response: str) -> tuple[str, Optional[str]]:
+        """Split a formatted reply into response text and suggested command."""
+        # Parse response and command in a single scan over the reply
+        matches = dict(_RESP_RE.findall(ai_response))
+        cmd = matches.get('COMMAND', '').strip()
+        suggested_command = cmd if cmd and cmd.upper() != 'NONE' else None
+        
+        # If parsing failed, use the whole response
+        response_text = matches.get('RESPONSE', '').strip() or ai_response
+        return response_text, suggested_command
+
+    def _start_ai_response(self, user_prompt: str) -> asyncio.Task:
+        """Snapshot the prompt and start the Gemini request as a background task."""
+        # The prompt is built now, so history appended while the request is in
+        # flight (such as the user message itself) isn't sent twice
+        contents, config = self._build_request(
+            f"USER: {user_prompt}",
+            "",
+            "Respond in the specified format:"
+        )
+        return asyncio.create_task(self._get_ai_response(contents, config))
+
+    async def _get_ai_response(self, contents: str, config: types.GenerateContentConfig) -> tuple[str, Optional[str]]:
+        """Get response from Gemini API without blocking the event loop."""
+        try:
+            # Stream the reply from Gemini, echoing tokens as they arrive
+            ai_response = await self._stream_reply(contents, config, stop_after_command=True)
+            return self._parse_reply(ai_response)
             
-            # Get response from Gemini
-            response = self.client.models.generate_content(
-                model="gemini-2.0-flash-exp",
-                contents=conversation_context
+        except Exception as e:
+            error_text = f"❌ Error getting AI response: {str(e)}"
+            print(f"\n🤖 AI Response:")
+            print(error_text)
+            return error_text, None
+
+    async def _get_ai_response_batch(self, prompts: List[str]) -> List[tuple[str, Optional[str]]]:
+        """Answer several queued prompts with a single Gemini request."""
+        try:
+            contents, config = self._build_request(
+                "USER: Answer each of the following questions:",
+                *(f"[Q{i}] {prompt}" for i, prompt in enumerate(prompts, 1)),
+                "",
+                "Answer each [Qi] as an [Ai] block, in order, each block in the specified format:",
+                max_output_tokens=_MAX_OUTPUT_TOKENS * len(prompts)
             )
-            ai_response = response.text.strip()
-            
-            # Parse response and command
-            response_text = ""
-            suggested_command = None
-            
-            lines = ai_response.split('\n')
-            for line in lines:
-                if line.startswith('RESPONSE:'):
-                    response_text = line.replace('RESPONSE:', '').strip()
-                elif line.startswith('COMMAND:'):
-                    cmd = line.replace('COMMAND:', '').strip()
-                    if cmd and cmd.upper() != 'NONE':
-                        suggested_command = cmd
-            
-            # If parsing failed, use the whole response
-            if not response_text:
-                response_text = ai_response
-                
-            return response_text, suggested_command
+            ai_response = await self._stream_reply(contents, config)
             
         except Exception as e:
-            return f"❌ Error getting AI response: {str(e)}", None
+            error_text = f"❌ Error getting AI response: {str(e)}"
+            print(f"\n🤖 AI Response:")
+            print(error_text)
+            return [(error_text, None)] * len(prompts)
+        
+        # re.split yields [preamble, "1", block1, "2", block2, ...]
+        pieces = _ANSWER_RE.split(ai_response)
+        blocks = {int(num): block.strip() for num, block in zip(pieces[1::2], pieces[2::2])}
+        return [
+            self._parse_reply(blocks[i]) if blocks.get(i) else ("❌ No answer returned for this prompt", None)
+            for i in range(1, len(prompts) + 1)
+        ]
+
+    @functools.cached_property
+    def _shell_argv(self) -> List[str]:
+        """Command line of the persistent shell."""
+        # An absolute path is one of the conditions for CPython to start the
+        # shell with posix_spawn rather than fork+exec
+        return [shutil.which("bash") or "/bin/bash"]
+
+    @functools.cached_property
+    def _line_buffering(self) -> str:
+        """Variable assignments that make a command line-buffer its stdout ("" without stdbuf)."""
+        # Programs block-buffer output written to a pipe. stdbuf works by
+        # preloading a library configured through the environment; asking it
+        # for those variables once lets them be set on each eval'd command,
+        # so its output streams as on a terminal while the shell itself runs
+        # without the preload. stderr is unbuffered already
+        stdbuf = shutil.which("stdbuf")
+        if not stdbuf:
+            return ""
+        try:
+            env = subprocess.run([stdbuf, "-oL", "env", "-0"], capture_output=True,
+                                 env=self._shell_env, check=True, timeout=5).stdout
+        except (OSError, subprocess.SubprocessError):
+            return ""
+        assignments = {}
+        for item in env.decode(errors="replace").split("\0"):
+            name, _, value = item.partition("=")
+            if name == "LD_PRELOAD" or name.startswith("_STDBUF_"):
+                assignments[name] = value
+        if "LD_PRELOAD" not in assignments:
+            return ""
+        return "".join(f"{name}={shlex.quote(value)} " for name, value in assignments.items())
 
-    def _execute_command(self, command: str) -> str:
+    @functools.cached_property
+    def _status_marker(self) -> bytes:
+        """How the status line printed after each command starts."""
+        # It starts its own line (the newline before it is the shell's, not
+        # the command's), so an echo of the sentinel elsewhere, e.g. in
+        # `set -x` tracing, is plain output
+        return b"\n" + self._sentinel
+
+    @functools.cached_property
+    def _status_re(self) -> re.Pattern:
+        """A whole status line: the command's return code and the shell's directory."""
+        return re.compile(re.escape(self._status_marker) + rb"(\d+) ([^\n]*)\n")
+
+    @functools.cached_property
+    def _shell_env(self) -> Dict[str, str]:
+        """Environment of the persistent shell."""
+        # Python ignores stdbuf, so ask its scripts to flush on their own
+        return {**os.environ, "PYTHONUNBUFFERED": "1"}
+
+    def _start_shell(self) -> subprocess.Popen:
+        """Start the long-lived bash process that runs every command."""
+        # close_fds=False (the commands' stdin fd is marked inheritable
+        # instead of using pass_fds) and cwd=None let CPython use posix_spawn,
+        # so the child doesn't have to copy this process's page tables first
+        working_directory = self.current_context['working_directory']
+        shell = subprocess.Popen(
+            self._shell_argv,
+            bufsize=0,
+            env=self._shell_env,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            close_fds=False,
+            cwd=None if working_directory == os.getcwd() else working_directory
+        )
+        # Output is read with select + os.read, so a partial line (a prompt,
+        # a progress bar) shows up without waiting for its newline
+        os.set_blocking(shell.stdout.fileno(), False)
+        return shell
+
+    async def _spawn(self, command: str) -> tuple[int, str]:
+        """Run a command in the persistent shell, streaming its output live; return (returncode, output tail)."""
+        return (await self._spawn_chain([command]))[0]
+
+    async def _spawn_chain(self, commands: List[str],
+                           between: Optional[Callable[[], None]] = None) -> List[tuple[int, str]]:
+        """Run commands back to back in one shell invocation, stopping at the first failure.
+
+        Returns (returncode, output tail) for each command that ran; `between`
+        is called after each command that succeeds and has a successor.
+        """
+        # Draining the shell blocks, so it runs on the I/O pool and background
+        # requests (prefetch, cache upkeep) keep going while a command runs
+        loop = asyncio.get_running_loop()
+        results, cwd = await loop.run_in_executor(self._io_pool, self._run_in_shell, commands, between)
+        self._set_working_directory(cwd)
+        return results
+
+    def _run_in_shell(self, commands: List[str],
+                      between: Optional[Callable[[], None]]) -> tuple[List[tuple[int, str]], str]:
+        """Blocking part of _spawn_chain; also returns the shell's last reported directory."""
+        # Restart the shell if a previous command ended it (e.g. `exit`)
+        if self._shell.poll() is not None:
+            self._shell = self._start_shell()
+        shell = self._shell
+        
+        # Each command is handed to eval as one quoted word, so even malformed
+        # input can't swallow the status line; assignments before eval last
+        # only while it runs, and its stdin is the user's terminal rather
+        # than the pipe bash reads commands from. The status line, on a line
+        # of its own, also reports the shell's directory, so a `cd` is
+        # noticed. The next command only runs if the previous one succeeded
+        sentinel = self._sentinel.decode()
+        script = ""
+        for command in reversed(commands):
+            step = (f"{self._line_buffering}eval {shlex.quote(command)} 0<&{self._command_stdin}; "
+                    f"__ha_rc=$?; printf '\\n{sentinel}%d %s\\n' \"$__ha_rc\" \"$PWD\"")
+            script = f"{step}; [ \"$__ha_rc\" = 0 ] && {{ {script}; }}" if script else step
+        shell.stdin.write(f"{script}\n".encode())
+        shell.stdin.flush()
+        
+        # Output is passed through as raw bytes as soon as it arrives, up to
+        # each status line; only its head and tail are kept (and decoded) for
+        # the history, so a huge output doesn't end up in every following prompt
+        sys.stdout.flush()
+        results = []
+        capture = _OutputCapture()
+        pending = b""  # Read but not yet passed through: a possible status line
+        shown = 0      # how much of `pending` is on the terminal already
+        cwd = ""
+        fd = shell.stdout.fileno()
+        with selectors.DefaultSelector() as selector:
+            selector.register(fd, selectors.EVENT_READ)
+            done = False
+            while not done:
+                if self._stop_drain.is_set():
+                    # Shutting down while the command still runs (or a
+                    # descendant still holds the pipe open, maybe writing to
+                    # it nonstop, so this is checked on every pass)
+                    results.append((-1 if shell.poll() is None else shell.returncode, capture.text()))
+                    break
+                if not selector.select(_HOLD_SECONDS if shown < len(pending) else _DRAIN_POLL_SECONDS):
+                    # Nothing more came: show what was held back, so e.g. a
+                    # line's newline isn't left for the next line to bring.
+                    # It stays pending (and unrecorded) in case it does
+                    # start a status line; bash writes the status line's
+                    # leading newline on its own
+                    self._pass_through(pending[shown:], None)
+                    shown = len(pending)
+                    continue
+                try:
+                    data = os.read(fd, _READ_CHUNK_SIZE)
+                except BlockingIOError:
+                    continue
+                if not data:
+                    # A command exited the shell itself
+                    self._pass_through(pending, capture, shown)
+                    pending = b""
+                    results.append((shell.wait(), capture.text()))
+                    break
+                
+                pending += data
+                while not done:
+                    index = pending.find(self._status_marker)
+                    end = pending.find(b"\n", index + len(self._status_marker)) if index >= 0 else -1
+                    if end < 0:
+                        # No complete status line yet: pass through everything
+                        # but what may turn out to be the start of one
+                        held = len(pending) - index if index >= 0 else self._sentinel_prefix_length(pending)
+                        self._pass_through(pending[:len(pending) - held], capture, shown)
+                        shown = max(0, shown - (len(pending) - held))
+                        pending = pending[len(pending) - held:]
+                        break
+                    
+                    status = self._status_re.match(pending, index)
+                    if not status:
+                        # The sentinel starts a line but isn't a status line
+                        self._pass_through(pending[:end], capture, shown)
+                        shown = max(0, shown - end)
+                        pending = pending[end:]
+                        continue
+                    self._pass_through(pending[:index], capture, shown)
+                    shown = max(0, shown - status.end())
+                    pending = pending[status.end():]
+                    returncode = int(status[1])
+                    cwd = os.fsdecode(status[2])
+                    results.append((returncode, capture.text()))
+                    done = returncode != 0 or len(results) == len(commands)
+                    if not done:
+                        capture = _OutputCapture()
+                        if between:
+                            between()
+        if pending:
+            # Late output (e.g. from a background job) is shown but not kept
+            self._pass_through(pending[shown:], None)
+        return results, cwd
+
+    def _sentinel_prefix_length(self, data: bytes) -> int:
+        """Length of the longest suffix of `data` that is a prefix of a status line."""
+        for size in range(min(len(data), len(self._status_marker) - 1), 0, -1):
+            if self._status_marker.startswith(data[-size:]):
+                return size
+        return 0
+
+    def _pass_through(self, data: bytes, capture: Optional[_OutputCapture], shown: int = 0):
+        """Show command output on the terminal (but for the first `shown` bytes, already there) and record it."""
+        if len(data) > shown:
+            sys.stdout.buffer.write(data[shown:])
+            sys.stdout.buffer.flush()
+        if data and capture is not None:
+            capture.add(data)
+
+    def _set_working_directory(self, path: str):
+        """Record the shell's current directory in the session context."""
+        if not path or path == self.current_context['working_directory']:
+            return
+        self.current_context['working_directory'] = path
+        # Reformat the context and fold it into a new cache on the next request
+        self.__dict__.pop('_context_block', None)
+        self._next_fold_at = self._history_count
+
+    def _append_section(self, parts: List[str], label: str, text: str):
+        """Append a labelled block of command output, if there is any."""
+        if text:
+            parts.extend([label, ":\n", text, "\n"])
+
+    async def _execute_command(self, command: str) -> str:
         """Execute a terminal command and return output."""
         try:
             print(f"🔧 Executing: {command}")
-            result = subprocess.run(
-                command,
-                shell=True,
-                capture_output=True,
-                text=True,
-                cwd=self.current_context['working_directory']
-            )
+            print(f"\n📤 Command Output:")
+            returncode, command_output = await self._spawn(command)
+            # Result sections are collected and joined once, instead of
+            # re-copying the (possibly large) output on every +=
+            parts = [command_output]
             
-            output = ""
-            if result.stdout:
-                output += f"STDOUT:\n{result.stdout}\n"
-            if result.stderr:
-                output += f"STDERR:\n{result.stderr}\n"
-            if result.returncode != 0:
-                output += f"Return code: {result.returncode}\n"
+            if returncode != 0:
+                parts.append(f"Return code: {returncode}\n")
+                output = "".join(parts)
                 
-                # Check if this is an error that can be auto-fixed
-                if result.returncode != 0 and (result.stderr or "error" in result.stdout.lower()):
-                    print(f"\n🚨 Command failed with return code {result.returncode}")
-                    
-                    # Try to get a fix suggestion
-                    error_output = result.stderr if result.stderr else result.stdout
-                    fix_suggestion = self._analyze_command_output_for_errors(command, error_output)
-                    
-                    # If no pattern-based fix, try AI-powered fix
-                    if not fix_suggestion:
+                # Check if this is an error that can be auto-fixed: a known
+                # pattern first, otherwise ask the AI
+                fix_suggestion = fix_task = advice = None
+                if command_output:
+                    kind, text = self._analyze_command_output_for_errors(command, output) or (None, None)
+                    if kind == "exec":
+                        fix_suggestion = text
+                    elif kind == "advice":
+                        # Nothing to run, just something to check
+                        advice = text
+                    else:
+                        fix_task = asyncio.create_task(self._get_error_fix_suggestion(command, output))
+                        # Let the task send its request before the banner is
+                        # printed; it is only awaited once the suggestion is due
+                        await asyncio.sleep(0)
+                
+                print(f"\n🚨 Command failed with return code {returncode}")
+                if command_output:
+                    if fix_task:
                         print("🤖 Analyzing error for potential fix...")
-                        fix_suggestion = self._get_error_fix_suggestion(command, output)
+                        fix_suggestion = await fix_task
                     
-                    if fix_suggestion:
+                    if advice:
+                        print(f"💡 Suggestion: {advice}")
+                    elif fix_suggestion:
                         print(f"💡 Suggested fix command:")
                         print(f"🔧 {fix_suggestion}")
                         
-                        choice = self._get_user_choice("❓ Apply this fix? (y/n): ")
+                        choice = await self._get_user_choice_async("❓ Apply this fix? (y/n): ")
                         if choice == 'y':
-                            print(f"\n🔧 Applying fix: {fix_suggestion}")
-                            fix_result = subprocess.run(
-                                fix_suggestion,
-                                shell=True,
-                                capture_output=True,
-                                text=True,
-                                cwd=self.current_context['working_directory']
-                            )
-                            
-                            fix_output = ""
-                            if fix_result.stdout:
-                                fix_output += f"FIX STDOUT:\n{fix_result.stdout}\n"
-                            if fix_result.stderr:
-                                fix_output += f"FIX STDERR:\n{fix_result.stderr}\n"
+                            # Ask about the retry up front so the fix and the
+                            # retry can run as a single shell invocation
+                            retry_choice = await self._get_user_choice_async("🔄 Retry the original command after the fix? (y/n): ")
+                            commands = [fix_suggestion, command] if retry_choice == 'y' else [fix_suggestion]
                             
-                            if fix_result.returncode == 0:
+                            def _announce_retry():
                                 print("✅ Fix applied successfully!")
-                                
-                                # Ask if user wants to retry the original command
-                                retry_choice = self._get_user_choice("🔄 Retry the original command? (y/n): ")
-                                if retry_choice == 'y':
-                                    print(f"\n🔧 Retrying: {command}")
-                                    retry_result = subprocess.run(
-                                        command,
-                                        shell=True,
-                                        capture_output=True,
-                                        text=True,
-                                        cwd=self.current_context['working_directory']
-                                    )
-                                    
-                                    retry_output = ""
-                                    if retry_result.stdout:
-                                        retry_output += f"RETRY STDOUT:\n{retry_result.stdout}\n"
-                                    if retry_result.stderr:
-                                        retry_output += f"RETRY STDERR:\n{retry_result.stderr}\n"
-                                    if retry_result.returncode != 0:
-                                        retry_output += f"RETRY Return code: {retry_result.returncode}\n"
-                                    
-                                    output += f"\n--- AFTER FIX ---\n{fix_output}\n--- RETRY RESULT ---\n{retry_output}"
-                                else:
-                                    output += f"\n--- FIX APPLIED ---\n{fix_output}"
+                                print(f"\n🔧 Retrying: {command}")
+                            
+                            print(f"\n🔧 Applying fix: {fix_suggestion}")
+                            (fix_returncode, fix_output), *retry = await self._spawn_chain(commands, _announce_retry)
+                            
+                            if fix_returncode != 0:
+                                print(f"❌ Fix failed with return code {fix_returncode}")
+                                parts.append("\n--- FIX ATTEMPT FAILED ---\n")
+                                self._append_section(parts, "FIX OUTPUT", fix_output)
+                            elif retry:
+                                retry_returncode, retry_output = retry[0]
+                                parts.append("\n--- AFTER FIX ---\n")
+                                self._append_section(parts, "FIX OUTPUT", fix_output)
+                                parts.append("\n--- RETRY RESULT ---\n")
+                                self._append_section(parts, "RETRY OUTPUT", retry_output)
+                                if retry_returncode != 0:
+                                    parts.append(f"RETRY Return code: {retry_returncode}\n")
                             else:
-                                print(f"❌ Fix failed with return code {fix_result.returncode}")
-                                output += f"\n--- FIX ATTEMPT FAILED ---\n{fix_output}"
+                                print("✅ Fix applied successfully!")
+                                parts.append("\n--- FIX APPLIED ---\n")
+                                self._append_section(parts, "FIX OUTPUT", fix_output)
                         else:
                             print("❌ Fix declined.")
+            elif not command_output:
+                print("✅ Command executed successfully (no output)")
                 
+            output = "".join(parts)
             return output if output else "Command executed successfully (no output)"
             
         except Exception as e:
             return f"❌ Error executing command: {str(e)}"
 
-    def _get_user_choice(self, prompt: str) -> str:
-        """Get user input with prompt."""
-        try:
-            return input(prompt).strip().lower()
-        except KeyboardInterrupt:
-            print("\n👋 Goodbye!")
-            sys.exit(0)
+    async def _ainput(self, prompt: str) -> str:
+        """Read a line from stdin without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def _settle(result: Optional[str], error: Optional[BaseException]):
+            if future.done():
+                return
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+        def _read():
+            try:
+                result, error = input(prompt), None
+            except Exception as e:
+                result, error = None, e
+            try:
+                loop.call_soon_threadsafe(_settle, result, error)
+            except RuntimeError:
+                pass  # Event loop already closed
+
+        # Daemon thread so a pending input() never blocks exit after Ctrl+C
+        threading.Thread(target=_read, daemon=True).start()
+        return await future
+
+    async def _get_user_choice_async(self, prompt: str) -> str:
+        """Get user input with prompt, awaiting it off the event loop."""
+        return (await self._ainput(prompt)).strip().lower()
 
     def _display_banner(self):
         """Display the cool HackAssistant ASCII banner."""
-        # Clear screen for dramatic effect
-        os.system('clear' if os.name == 'posix' else 'cls')
-        
-        # Main banner with gradient-like colors
-        banner_lines = [
-            "\033[38;5;196m" + "  ██╗  ██╗ █████╗  ██████╗██╗  ██╗" + "\033[0m",
-            "\033[38;5;202m" + "  ██║  ██║██╔══██╗██╔════╝██║ ██╔╝" + "\033[0m", 
-            "\033[38;5;208m" + "  ███████║███████║██║     █████╔╝" + "\033[0m",
-            "\033[38;5;214m" + "  ██╔══██║██╔══██║██║     ██╔═██╗" + "\033[0m",
-            "\033[38;5;220m" + "  ██║  ██║██║  ██║╚██████╗██║  ██╗" + "\033[0m",
-            "\033[38;5;226m" + "  ╚═╝  ╚═╝╚═╝  ╚═╝ ╚═════╝╚═╝  ╚═╝" + "\033[0m",
-            "",
-            "\033[38;5;46m" + "   █████╗ ███████╗███████╗██╗███████╗████████╗ █████╗ ███╗   ██╗████████╗" + "\033[0m",
-            "\033[38;5;82m" + "  ██╔══██╗██╔════╝██╔════╝██║██╔════╝╚══██╔══╝██╔══██╗████╗  ██║╚══██╔══╝" + "\033[0m",
-            "\033[38;5;118m" + "  ███████║███████╗███████╗██║███████╗   ██║   ███████║██╔██╗ ██║   ██║   " + "\033[0m",
-            "\033[38;5;154m" + "  ██╔══██║╚════██║╚════██║██║╚════██║   ██║   ██╔══██║██║╚██╗██║   ██║   " + "\033[0m",
-            "\033[38;5;190m" + "  ██║  ██║███████║███████║██║███████║   ██║   ██║  ██║██║ ╚████║   ██║   " + "\033[0m",
-            "\033[38;5;226m" + "  ╚═╝  ╚═╝╚══════╝╚══════╝╚═╝╚══════╝   ╚═╝   ╚═╝  ╚═╝╚═╝  ╚═══╝   ╚═╝   " + "\033[0m"
-        ]
-        
-        # Print top border
-        print("\033[38;5;51m" + "╔" + "═" * 78 + "╗" + "\033[0m")
-        print("\033[38;5;51m" + "║" + " " * 78 + "║" + "\033[0m")
-        
-        # Print banner lines centered
-        for line in banner_lines:
-            # Remove ANSI codes to calculate actual text length
-            import re
-            clean_line = re.sub(r'\033\[[0-9;]*m', '', line)
-            padding = (78 - len(clean_line)) // 2
-            print("\033[38;5;51m║\033[0m" + " " * padding + line + " " * (78 - padding - len(clean_line)) + "\033[38;5;51m║\033[0m")
-        
-        # Middle section with effects
-        print("\033[38;5;51m" + "║" + " " * 78 + "║" + "\033[0m")
-        
-        # Subtitle and features with animated-style text
-        features = [
-            "\033[1;38;5;201m🔥 ELITE HACKER AI ASSISTANT 🔥\033[0m",
-            "\033[1;38;5;129m🤖 Powered by Google Gemini 2.0 🤖\033[0m",
-            "",
-            "\033[38;5;46m[⚡] \033[1;37mPenetration Testing & Security Research\033[0m \033[38;5;46m[⚡]\033[0m",
-            "\033[38;5;196m[🛡️ ] \033[1;37mSystem Administration & DevOps\033[0m \033[38;5;196m[🛡️ ]\033[0m", 
-            "\033[38;5;75m[💻] \033[1;37mDevelopment & Automation Tasks\033[0m \033[38;5;75m[💻]\033[0m",
-            "\033[38;5;226m[🧠] \033[1;37mIntelligent Command Suggestions\033[0m \033[38;5;226m[🧠]\033[0m",
-            "\033[38;5;135m[🎯] \033[1;37mContext-Aware AI Responses\033[0m \033[38;5;135m[🎯]\033[0m"
-        ]
-        
-        for feature in features:
-            # Calculate padding for centering
-            clean_feature = re.sub(r'\033\[[0-9;]*m', '', feature)
-            padding = (78 - len(clean_feature)) // 2
-            print("\033[38;5;51m║\033[0m" + " " * padding + feature + " " * (78 - padding - len(clean_feature)) + "\033[38;5;51m║\033[0m")
-        
-        # Bottom border
-        print("\033[38;5;51m" + "║" + " " * 78 + "║" + "\033[0m")
-        print("\033[38;5;51m" + "╚" + "═" * 78 + "╝" + "\033[0m")
-        
-        # Warning with blinking effect
-        print("\n" + "\033[1;5;91m🚨 WARNING: FOR AUTHORIZED PENETRATION TESTING & RESEARCH ONLY! 🚨\033[0m")
-        print("\033[1;93m⚖️  Always obtain proper authorization before security testing! ⚖️\033[0m\n")
+        # Clear screen for dramatic effect (with the escape sequence rather
+        # than by running `clear`), then the banner and warning, all in one
+        # write instead of a print per line
+        sys.stdout.write(_BANNER_STR)
+        sys.stdout.flush()
 
-    def _analyze_command_output_for_errors(self, command: str, output: str) -> Optional[str]:
-        """Analyze command output for common errors and suggest fixes."""
-        output_lower = output.lower()
-        
-        # Common error patterns and their fixes
-        error_fixes = {
-            "permission denied": f"sudo {command}",
-            "command not found": None,  # Will be handled specially
-            "no such file or directory": f"ls -la && {command}",
-            "connection refused": "Check if the service is running or firewall settings",
-            "network unreachable": "Check network connectivity with: ping 8.8.8.8",
-            "port already in use": "Check what's using the port with: netstat -tulnp",
-            "disk space": "Check disk usage with: df -h",
-            "memory": "Check memory usage with: free -h",
-            "syntax error": "Review the command syntax",
-            "access denied": f"sudo {command}",
-            "authentication failed": "Check credentials or permissions"
-        }
-        
-        # Check for command not found specifically
-        if "command not found" in output_lower:
-            cmd_name = command.split()[0] if command.split() else ""
-            if cmd_name:
-                return f"apt-get update && apt-get install -y {cmd_name}"
+    def _analyze_command_output_for_errors(self, command: str, output: str) -> Optional[tuple[str, str]]:
+        """Analyze command output for common errors; return ("exec", fix command) or ("advice", text)."""
+        # One case-insensitive scan finds every known pattern in the output,
+        # then the highest-priority one present decides the fix
+        found = {match.group().lower() for match in _ERROR_RE.finditer(output)}
+        if not found:
+            return None
         
-        # Check for other error patterns
-        for error_pattern, fix in error_fixes.items():
-            if error_pattern in output_lower and fix:
-                return fix
+        words = command.split()
+        program = words[0] if words else ""
+        for error_pattern, fix in _EXECUTABLE_FIXES.items():
+            if error_pattern in found and (program or "{program}" not in fix):
+                return "exec", fix.format(command=command, program=program)
+        for error_pattern, advice in _ADVICE_FIXES.items():
+            if error_pattern in found:
+                return "advice", advice
                 
         return None
 
-    def _get_error_fix_suggestion(self, command: str, output: str) -> Optional[str]:
+    async def _get_error_fix_suggestion(self, command: str, output: str) -> Optional[str]:
         """Get AI-powered error fix suggestion."""
         try:
             error_prompt = f"""The command '{command}' failed with this output:
@@ -371,33 +1073,140 @@ Please provide a specific Linux command to fix this error. Respond in format:
 RESPONSE: Brief explanation of the error
 COMMAND: Single command to fix the issue, or NONE if cannot be fixed automatically"""
 
-            # Get AI response for error fixing
-            response = self.client.models.generate_content(
-                model="gemini-2.0-flash-exp",
-                contents=error_prompt
+            # Stream the AI's diagnosis so it shows up as it is generated
+            ai_response = await self._stream_reply(
+                error_prompt, self._fix_config, stop_after_command=True, header=None
             )
-            ai_response = response.text.strip()
             
-            # Parse the response for suggested fix command
-            lines = ai_response.split('\n')
-            for line in lines:
-                if line.startswith('COMMAND:'):
-                    cmd = line.replace('COMMAND:', '').strip()
-                    if cmd and cmd.upper() != 'NONE':
-                        return cmd
+            # Same RESPONSE:/COMMAND: format as a normal reply
+            _, fix_command = self._parse_reply(ai_response)
+            return fix_command
+            
+        except Exception:
             return None
+
+    async def _handle_suggested_command(self, suggested_command: str) -> Optional[bool]:
+        """Offer a suggested command; return whether it ran, or None on an invalid choice."""
+        print(f"\n💡 Suggested command:")
+        print(f"📋 {suggested_command}")
+        
+        choice = await self._get_user_choice_async("\n❓ Execute this command? (y/n): ")
+        
+        if choice == 'y':
+            # Output is streamed to the terminal while the command runs
+            command_output = await self._execute_command(suggested_command)
             
+            # Add command and output to history for context
+            self._add_to_history("system", f"Executed command: {suggested_command}")
+            self._add_to_history("system", f"Command output: {command_output}")
+            return True
+        elif choice == 'n':
+            print("❌ Command declined.")
+            return False
+        else:
+            print("❓ Invalid choice. Please enter 'y' or 'n'")
+            return None
+
+    def _print_next_step_hint(self, executed: Optional[bool]):
+        """Tell the user how to carry on after a turn."""
+        if executed:
+            # Continue the conversation automatically
+            print(f"\n🔄 Continue working... (enter 'continue' for the next step, 'p' for new prompt, 'c' to close)")
+        elif executed is not None:
+            print("💬 Enter new prompt (or 'p' for prompt mode, 'c' to close):")
+
+    def _start_prefetch(self):
+        """Speculatively request the next step while the user reads the last output."""
+        self._cancel_prefetch()
+        contents, config = self._build_request(
+            f"USER: {_FOLLOWUP_PROMPT}",
+            "",
+            "Respond in the specified format:",
+            max_output_tokens=_PREFETCH_MAX_TOKENS
+        )
+        self._prefetch_task = self._run_in_background(self._prefetch_reply(contents, config))
+
+    async def _prefetch_reply(self, contents: str, config: types.GenerateContentConfig) -> Optional[str]:
+        """Fetch a reply without streaming it; None if the request failed or was cut off."""
+        from google.genai import types
+        try:
+            response = await self.client.aio.models.generate_content(
+                model=_MODEL,
+                contents=contents,
+                config=config
+            )
+            if response.candidates and response.candidates[0].finish_reason == types.FinishReason.MAX_TOKENS:
+                return None
+            return (response.text or "").strip() or None
         except Exception:
             return None
 
-    def run(self):
+    def _cancel_prefetch(self):
+        """Drop a speculative follow-up that is no longer going to be used."""
+        if self._prefetch_task:
+            self._prefetch_task.cancel()
+            self._prefetch_task = None
+
+    async def _take_prefetched_reply(self) -> Optional[tuple[str, Optional[str]]]:
+        """Show and parse the speculative follow-up reply, if one is available."""
+        task, self._prefetch_task = self._prefetch_task, None
+        if task is None:
+            return None
+        ai_response = await task
+        if not ai_response:
+            return None
+        # Like a streamed reply, drop anything generated after the COMMAND: line
+        match = _COMMAND_LINE_RE.search(ai_response + "\n")
+        if match:
+            ai_response = ai_response[:match.end()].strip()
+        print(f"\n🤖 AI Response:")
+        print(ai_response)
+        return self._parse_reply(ai_response)
+
+    async def _run_batch(self) -> bool:
+        """Collect several prompts and answer them with one Gemini request."""
+        print("📚 Batch mode: enter one prompt per line, empty line to send:")
+        prompts = []
+        while True:
+            line = (await self._ainput(f"  [Q{len(prompts) + 1}] ")).strip()
+            if not line:
+                break
+            prompts.append(line)
+        
+        if not prompts:
+            print("💬 Enter new prompt (or 'p' for prompt mode, 'c' to close):")
+            return False
+        
+        print(f"🤖 Thinking about {len(prompts)} prompts...")
+        answers = await self._get_ai_response_batch(prompts)
+        
+        for prompt, (ai_response, _) in zip(prompts, answers):
+            self._add_to_history("user", prompt)
+            self._add_to_history("assistant", ai_response)
+        
+        executed = False
+        for i, (_, suggested_command) in enumerate(answers, 1):
+            if suggested_command:
+                print(f"\n🔢 [A{i}]", end="")
+                executed = await self._handle_suggested_command(suggested_command) or executed
+        self._print_next_step_hint(executed)
+        return executed
+
+    async def run_async(self):
+        """Run the conversation, releasing session resources on exit."""
+        try:
+            await self._conversation_loop()
+        finally:
+            await self._close()
+
+    async def _conversation_loop(self):
         """Main conversation loop."""
         print("\n💬 Enter your first prompt (or 'c' to close):")
         
         while True:
             try:
                 # Get user input
-                user_input = input("🔥 hackassistant> ").strip()
+                user_input = (await self._ainput("🔥 hackassistant> ")).strip()
                 
                 if not user_input:
                     continue
@@ -410,47 +1219,54 @@ COMMAND: Single command to fix the issue, or NONE if cannot be fixed automatical
                     print("💬 Enter your prompt:")
                     continue
                 
-                # Add user message to history
-                self._add_to_history("user", user_input)
+                elif user_input.lower() == 'b':
+                    self._cancel_prefetch()
+                    if await self._run_batch():
+                        self._start_prefetch()
+                    continue
                 
-                # Get AI response
-                print("🤖 Thinking...")
-                ai_response, suggested_command = self._get_ai_response(user_input)
+                # A "continue" right after a command can use the follow-up that
+                # was speculatively requested while the user read its output
+                reply = None
+                thinking_shown = False
+                if user_input.lower() in _CONTINUE_WORDS:
+                    if self._prefetch_task and not self._prefetch_task.done():
+                        print("🤖 Thinking...")
+                        thinking_shown = True
+                    reply = await self._take_prefetched_reply()
+                else:
+                    self._cancel_prefetch()
                 
-                # Display AI response
-                print(f"\n🤖 AI Response:")
-                print(f"{ai_response}")
+                if reply:
+                    self._add_to_history("user", user_input)
+                    ai_response, suggested_command = reply
+                else:
+                    # Dispatch the AI request first, then do local bookkeeping while
+                    # it is in flight; sleep(0) lets the task send the request
+                    response_task = self._start_ai_response(user_input)
+                    await asyncio.sleep(0)
+                    
+                    # Add user message to history
+                    self._add_to_history("user", user_input)
+                    
+                    # Get AI response
+                    if not thinking_shown:
+                        print("🤖 Thinking...")
+                    # The response is streamed to the terminal as it is generated
+                    ai_response, suggested_command = await response_task
                 
                 # Add AI response to history
                 self._add_to_history("assistant", ai_response)
                 
                 # Handle suggested command
+                executed = False
                 if suggested_command:
-                    print(f"\n💡 Suggested command:")
-                    print(f"📋 {suggested_command}")
-                    
-                    choice = self._get_user_choice("\n❓ Execute this command? (y/n): ")
-                    
-                    if choice == 'y':
-                        command_output = self._execute_command(suggested_command)
-                        print(f"\n📤 Command Output:")
-                        print(command_output)
-                        
-                        # Add command and output to history for context
-                        self._add_to_history("system", f"Executed command: {suggested_command}")
-                        self._add_to_history("system", f"Command output: {command_output}")
-                        
-                        # Continue the conversation automatically
-                        print(f"\n🔄 Continue working... (enter 'p' for new prompt, 'c' to close)")
-                        
-                    elif choice == 'n':
-                        print("❌ Command declined.")
-                        print("💬 Enter new prompt (or 'p' for prompt mode, 'c' to close):")
-                    else:
-                        print("❓ Invalid choice. Please enter 'y' or 'n'")
-                        
-                else:
-                    print("💬 Enter new prompt (or 'p' for prompt mode, 'c' to close):")
+                    executed = await self._handle_suggested_command(suggested_command)
+                self._print_next_step_hint(executed)
+                
+                # Get a head start on the next step while the user reads the output
+                if executed:
+                    self._start_prefetch()
                     
             except KeyboardInterrupt:
                 print("\n👋 Goodbye!")
@@ -464,7 +1280,7 @@ def main():
     """Main entry point."""
     try:
         assistant = HackAssistant()
-        assistant.run()
+        asyncio.run(assistant.run_async())
     except KeyboardInterrupt:
         print("\n👋 Goodbye!")
     except Exception as e:
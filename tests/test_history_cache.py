@@ -0,0 +1,142 @@
+"""Tests for how the conversation history is split between the context cache and the prompt."""
+
+import asyncio
+import time
+import unittest
+from collections import deque
+from types import SimpleNamespace
+from unittest import mock
+
+import hackassistant
+from hackassistant import HackAssistant
+
+
+class APIError(Exception):
+    """Stand-in for google.genai.errors.APIError, which carries the HTTP status as `code`."""
+
+    def __init__(self, code):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+
+
+class FakeCaches:
+    def __init__(self):
+        self.error = None
+        self.created = 0
+        self.deleted = []
+
+    async def create(self, model, config):
+        if self.error:
+            raise self.error
+        self.created += 1
+        return SimpleNamespace(name=f"cachedContents/{self.created}")
+
+    async def delete(self, name):
+        self.deleted.append(name)
+
+
+def make_assistant():
+    """A HackAssistant with just the state the history/cache code uses (no API key, shell or banner)."""
+    assistant = object.__new__(HackAssistant)
+    assistant.caches = FakeCaches()
+    assistant.client = SimpleNamespace(aio=SimpleNamespace(caches=assistant.caches))
+    assistant.conversation_history = deque()
+    assistant.current_context = {"working_directory": "/tmp", "os_info": "Linux", "session_start": "now"}
+    assistant._background_tasks = set()
+    assistant._history_count = 0
+    assistant._cached_count = 0
+    assistant._next_fold_at = hackassistant._CACHE_FOLD_MESSAGES
+    assistant._cache_fold_task = None
+    assistant._retired_cache = None
+    assistant._caching_failed = False
+    assistant._cached_context_block = assistant._context_block
+    assistant._cache_refreshed_at = time.monotonic()
+    assistant.system_cache = SimpleNamespace(name="cachedContents/0")
+    # The SDK isn't needed to build these configs; only their cache use matters
+    assistant._cache_config = lambda: None
+    assistant.__dict__["_gen_config"] = "cached config"
+    return assistant
+
+
+class UncachedHistoryTest(unittest.TestCase):
+    def test_uncached_messages_outlive_the_window(self):
+        assistant = make_assistant()
+        # A fold still in flight keeps new ones from starting, so more than a
+        # window's worth of messages piles up on top of the cache
+        assistant._cache_fold_task = object()
+        count = hackassistant._HISTORY_WINDOW + 10
+        for i in range(count):
+            assistant._add_to_history("user", f"message {i}")
+        self.assertEqual(len(assistant.conversation_history), count)
+        contents, _ = assistant._build_request("USER: next")
+        self.assertEqual(contents.count("USER: message "), count)
+        self.assertTrue(contents.startswith("USER: message 0\n"))
+
+    def test_history_is_trimmed_once_cached(self):
+        assistant = make_assistant()
+        assistant._cache_fold_task = object()
+        for i in range(hackassistant._HISTORY_WINDOW + 10):
+            assistant._add_to_history("user", f"message {i}")
+        assistant._cached_count = assistant._history_count
+        assistant._add_to_history("user", "after the fold")
+        self.assertEqual(len(assistant.conversation_history), hackassistant._HISTORY_WINDOW)
+        contents, _ = assistant._build_request("USER: next")
+        self.assertEqual(contents, "USER: after the fold\nUSER: next")
+
+    def test_window_applies_without_a_cache(self):
+        assistant = make_assistant()
+        assistant.system_cache = None
+        assistant._caching_failed = True
+        for i in range(hackassistant._HISTORY_WINDOW + 10):
+            assistant._add_to_history("user", f"message {i}")
+        self.assertEqual(len(assistant.conversation_history), hackassistant._HISTORY_WINDOW)
+        self.assertEqual(assistant.conversation_history[0].content, "message 10")
+
+
+class FoldFailureTest(unittest.TestCase):
+    def setUp(self):
+        self.assistant = make_assistant()
+        for i in range(hackassistant._CACHE_FOLD_MESSAGES):
+            self.assistant._add_to_history("user", f"message {i}")
+        # Every prompt counts as big enough to cache
+        patcher = mock.patch.object(hackassistant, "_CACHE_MIN_TOKENS", 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fold(self):
+        asyncio.run(self.assistant._fold_history_into_cache())
+
+    def test_transient_error_keeps_cache_and_retries(self):
+        self.assistant.caches.error = APIError(503)
+        self.assistant._next_fold_at = self.assistant._history_count + hackassistant._CACHE_FOLD_MESSAGES
+        self.fold()
+        self.assertFalse(self.assistant._caching_failed)
+        self.assertEqual(self.assistant.system_cache.name, "cachedContents/0")
+        self.assertLessEqual(self.assistant._next_fold_at, self.assistant._history_count)
+
+    def test_refused_create_falls_back_to_inline_prompt(self):
+        self.assistant.caches.error = APIError(400)
+        self.fold()
+        self.assertTrue(self.assistant._caching_failed)
+        self.assertIsNone(self.assistant.system_cache)
+        self.assertNotIn("_gen_config", self.assistant.__dict__)
+
+        # The whole history goes back into the prompt, and no more folds are tried
+        self.assistant.__dict__["_gen_config"] = "inline config"
+        for i in range(hackassistant._CACHE_FOLD_MESSAGES, 20):
+            self.assistant._add_to_history("user", f"message {i}")
+        contents, config = self.assistant._build_request("USER: next")
+        self.assertEqual(config, "inline config")
+        self.assertTrue(contents.startswith(self.assistant._static_preamble))
+        self.assertIn("USER: message 0\n", contents)
+        self.assertIsNone(self.assistant._cache_fold_task)
+
+    def test_successful_fold_replaces_cache(self):
+        self.fold()
+        self.assertEqual(self.assistant.system_cache.name, "cachedContents/1")
+        self.assertEqual(self.assistant._cached_count, self.assistant._history_count)
+        self.assertEqual(self.assistant._retired_cache.name, "cachedContents/0")
+
+
+if __name__ == "__main__":
+    unittest.main()
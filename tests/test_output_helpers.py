@@ -0,0 +1,77 @@
+"""Tests for the helpers that trim command output and streamed replies."""
+
+import unittest
+
+import hackassistant
+from hackassistant import HackAssistant, _OutputCapture
+
+
+class OutputCaptureTest(unittest.TestCase):
+    def test_short_output_is_kept_whole(self):
+        capture = _OutputCapture()
+        capture.add(b"one\n")
+        capture.add(b"two\n")
+        self.assertEqual(capture.text(), "one\ntwo\n")
+
+    def test_long_output_keeps_head_and_tail(self):
+        head_size, tail_size = hackassistant._OUTPUT_HEAD_BYTES, hackassistant._OUTPUT_TAIL_BYTES
+        capture = _OutputCapture()
+        # Many small chunks, so the tail is trimmed in bulk along the way
+        data = b"".join(b"%07d\n" % i for i in range(10000))
+        for i in range(0, len(data), 100):
+            capture.add(data[i:i + 100])
+        text = capture.text()
+        self.assertTrue(text.startswith(data[:head_size].decode()))
+        self.assertTrue(text.endswith(data[-tail_size:].decode()))
+        self.assertIn(f"[{len(data) - head_size - tail_size} bytes truncated]", text)
+
+    def test_multibyte_characters_cut_in_half_are_replaced(self):
+        capture = _OutputCapture()
+        capture.add("é".encode()[:1])
+        self.assertEqual(capture.text(), "�")
+
+
+class CutAfterCommandTest(unittest.TestCase):
+    def test_text_before_command_is_kept(self):
+        self.assertEqual(
+            HackAssistant._cut_after_command("", "RESPONSE: hi\nCOMM"),
+            ("RESPONSE: hi\nCOMM", "COMM", False)
+        )
+
+    def test_command_line_completed_across_chunks(self):
+        kept, partial, done = HackAssistant._cut_after_command("COMMAND: ls", " -la\nUSER: more")
+        self.assertTrue(done)
+        self.assertEqual(kept, " -la\n")
+        self.assertEqual(partial, "")
+
+
+class ErrorAnalysisTest(unittest.TestCase):
+    def analyze(self, command, output):
+        return HackAssistant._analyze_command_output_for_errors(None, command, output)
+
+    def test_executable_fix_uses_program_name(self):
+        self.assertEqual(
+            self.analyze("nmap -sT localhost", "bash: nmap: command not found"),
+            ("exec", "apt-get update && apt-get install -y nmap")
+        )
+
+    def test_match_is_case_insensitive(self):
+        self.assertEqual(self.analyze("cat /etc/shadow", "Permission Denied"), ("exec", "sudo cat /etc/shadow"))
+
+    def test_executable_fix_wins_over_advice(self):
+        kind, _ = self.analyze("ssh host", "Connection refused\nPermission denied")
+        self.assertEqual(kind, "exec")
+
+    def test_advice_only(self):
+        self.assertEqual(
+            self.analyze("df", "No disk space left"),
+            ("advice", "Check disk usage with: df -h")
+        )
+
+    def test_unknown_error(self):
+        self.assertIsNone(self.analyze("false", ""))
+        self.assertIsNone(self.analyze("make", "error: something odd"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+"""Tests for parsing the RESPONSE:/COMMAND: format of Gemini replies."""
+
+import asyncio
+import unittest
+
+from hackassistant import HackAssistant
+
+
+def parse(text):
+    """Run the reply parser (it uses no instance state)."""
+    return HackAssistant._parse_reply(None, text)
+
+
+class ParseReplyTest(unittest.TestCase):
+    def test_response_and_command(self):
+        self.assertEqual(
+            parse("RESPONSE: Listing files.\nCOMMAND: ls -la"),
+            ("Listing files.", "ls -la")
+        )
+
+    def test_none_command(self):
+        self.assertEqual(parse("RESPONSE: Nothing to run.\nCOMMAND: NONE"), ("Nothing to run.", None))
+
+    def test_blank_command_does_not_take_next_line(self):
+        reply = "RESPONSE: ok\nCOMMAND: \n\nNote: be careful with this"
+        self.assertEqual(parse(reply), ("ok", None))
+
+    def test_blank_response_does_not_take_command_line(self):
+        reply = "RESPONSE:\nCOMMAND: ls"
+        response, command = parse(reply)
+        self.assertEqual(command, "ls")
+        self.assertNotEqual(response, "COMMAND: ls")
+
+    def test_unformatted_reply_is_used_whole(self):
+        self.assertEqual(parse("Just some text"), ("Just some text", None))
+
+
+class BatchReplyTest(unittest.TestCase):
+    def answer(self, prompts, reply):
+        """Split a batched reply for `prompts` (no request is made)."""
+        assistant = object.__new__(HackAssistant)
+        assistant._build_request = lambda *lines, **options: ("", None)
+
+        async def stream_reply(contents, config):
+            return reply
+        assistant._stream_reply = stream_reply
+        return asyncio.run(assistant._get_ai_response_batch(prompts))
+
+    def test_answers_are_matched_to_prompts(self):
+        reply = "[A1]\nRESPONSE: one\nCOMMAND: ls\n\n[A2]\nRESPONSE: two\nCOMMAND: NONE"
+        self.assertEqual(self.answer(["a", "b"], reply), [("one", "ls"), ("two", None)])
+
+    def test_missing_answer_is_reported(self):
+        reply = "[A2]\nRESPONSE: two\nCOMMAND: pwd"
+        first, second = self.answer(["a", "b"], reply)
+        self.assertEqual(first, ("❌ No answer returned for this prompt", None))
+        self.assertEqual(second, ("two", "pwd"))
+
+
+if __name__ == "__main__":
+    unittest.main()
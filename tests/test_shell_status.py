@@ -0,0 +1,95 @@
+"""Tests for reading command output and status lines from the persistent shell."""
+
+import io
+import os
+import threading
+import unittest
+import uuid
+from unittest import mock
+
+from hackassistant import HackAssistant
+
+
+def make_assistant():
+    """A HackAssistant with just the state the shell code uses (no API key, cache or banner)."""
+    assistant = object.__new__(HackAssistant)
+    assistant.current_context = {"working_directory": os.getcwd()}
+    assistant._command_stdin = os.open(os.devnull, os.O_RDONLY)
+    os.set_inheritable(assistant._command_stdin, True)
+    assistant._sentinel = f"__HA_RC_{uuid.uuid4().hex}__".encode()
+    assistant._stop_drain = threading.Event()
+    assistant.__dict__["_line_buffering"] = ""
+    return assistant
+
+
+class StatusLineTest(unittest.TestCase):
+    def setUp(self):
+        self.assistant = make_assistant()
+        self.assistant._shell = self.assistant._start_shell()
+        self.addCleanup(self.close_shell)
+
+    def close_shell(self):
+        shell = self.assistant._shell
+        shell.stdin.close()
+        shell.wait(timeout=5)
+        shell.stdout.close()
+        os.close(self.assistant._command_stdin)
+
+    def run_commands(self, *commands):
+        """Run commands in the shell; return (results, cwd, what reached the terminal)."""
+        terminal = io.BytesIO()
+        with mock.patch("sys.stdout", io.TextIOWrapper(terminal)):
+            results, cwd = self.assistant._run_in_shell(list(commands), None)
+            return results, cwd, terminal.getvalue()
+
+    def test_output_and_return_code(self):
+        results, _, terminal = self.run_commands("echo hi; (exit 3)")
+        self.assertEqual(results, [(3, "hi\n")])
+        self.assertTrue(terminal.startswith(b"hi\n"))
+        self.assertNotIn(self.assistant._sentinel, terminal)
+
+    def test_output_without_trailing_newline_is_kept_as_is(self):
+        results, _, _ = self.run_commands("printf noeol", "printf 'x\\n\\n'")
+        self.assertEqual(results, [(0, "noeol"), (0, "x\n\n")])
+
+    def test_chain_stops_at_first_failure(self):
+        results, _, _ = self.run_commands("true", "false", "echo never")
+        self.assertEqual(results, [(0, ""), (1, "")])
+
+    def test_directory_change_is_reported(self):
+        _, cwd, _ = self.run_commands("cd /")
+        self.assertEqual(cwd, "/")
+
+    def test_sentinel_in_trace_output_is_plain_output(self):
+        results, _, _ = self.run_commands("set -x", "echo hi", "set +x")
+        self.assertEqual([returncode for returncode, _ in results], [0, 0, 0])
+        self.assertIn("hi\n", results[1][1])
+        self.assertIn(self.assistant._sentinel.decode(), results[1][1])
+
+    def test_sentinel_line_that_does_not_parse_is_plain_output(self):
+        line = self.assistant._sentinel.decode() + "oops"
+        results, _, _ = self.run_commands(f"printf 'a\\n{line}\\n'", "echo next")
+        self.assertEqual(results, [(0, f"a\n{line}\n"), (0, "next\n")])
+
+    def test_shell_exiting_is_noticed(self):
+        results, _, _ = self.run_commands("echo bye; exit 7")
+        self.assertEqual(results, [(7, "bye\n")])
+
+
+class SentinelPrefixTest(unittest.TestCase):
+    def setUp(self):
+        self.assistant = make_assistant()
+        self.addCleanup(os.close, self.assistant._command_stdin)
+
+    def test_partial_status_marker_is_held(self):
+        marker = self.assistant._status_marker
+        self.assertEqual(self.assistant._sentinel_prefix_length(b"output" + marker[:5]), 5)
+        self.assertEqual(self.assistant._sentinel_prefix_length(b"output\n"), 1)
+
+    def test_unrelated_suffix_is_not_held(self):
+        self.assertEqual(self.assistant._sentinel_prefix_length(b"output"), 0)
+        self.assertEqual(self.assistant._sentinel_prefix_length(b""), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()